@@ -1,18 +1,31 @@
 import streamlit as st
-import pandas as pd
 import qrcode
 import shutil
 import calendar
 import datetime as dt
 from PIL import Image
 import os
+import csv
+import io
 from datetime import datetime, date
 import cv2
-from streamlit_webrtc import webrtc_streamer, VideoTransformerBase
+from streamlit_webrtc import webrtc_streamer, VideoProcessorBase
+import av
 import time
+import threading
+import atexit
+import logging
+import queue
+import collections
 import numpy as np
 from pathlib import Path
 
+try:
+    from pyzbar.pyzbar import decode as zbar_decode, ZBarSymbol
+except ImportError:
+    # pyzbar or the libzbar system library is missing; use OpenCV's detector
+    zbar_decode = None
+
 # ---------------------------------
 # PAGE CONFIG
 # ---------------------------------
@@ -95,6 +108,35 @@ body {
     background-color: #312D2D;       
     transform: scale(1.05);
 }
+
+/* Slide-in popup */
+.custom-slidein {
+    position: fixed;
+    top: 8vh;
+    right: 2vw;
+    left: 2vw;
+    z-index: 9999;
+    background: #007bff;
+    color: #fff;
+    padding: 1rem 2rem;
+    border-radius: 1em;
+    font-size: 1.1rem;
+    font-weight: 600;
+    box-shadow: 0 5px 20px rgba(0,0,0,0.2);
+    max-width: 96vw;
+    text-align: center;
+    animation: slidein 2.4s cubic-bezier(.25,.1,.25,1) forwards;
+}
+.slidein-success { background: #22bb33; }
+.slidein-warning { background: #ffcc00; }
+.slidein-error { background: #ff4444; }
+.slidein-info { background: #007bff; }
+@keyframes slidein {
+    0% { top: -80px; opacity: 0; }
+    10% { top: 8vh; opacity: 1; }
+    80% { top: 8vh; opacity: 1; }
+    100% { top: -80px; opacity: 0; }
+}
 </style>
 """, unsafe_allow_html=True)
 
@@ -103,42 +145,8 @@ body {
 # Slide-in popup with timer
 # ==============================
 def slidein_message(msg, type_="info"):
-    color_map = {
-        "success": "#22bb33",
-        "warning": "#ffcc00",
-        "error": "#ff4444",
-        "info": "#007bff"
-    }
-    bg_color = color_map.get(type_, "#007bff")
-    css = f"""
-    <style>
-    .custom-slidein {{
-        position: fixed;
-        top: 8vh;
-        right: 2vw;
-        left: 2vw;
-        z-index: 9999;
-        background: {bg_color};
-        color: #fff;
-        padding: 1rem 2rem;
-        border-radius: 1em;
-        font-size: 1.1rem;
-        font-weight: 600;
-        box-shadow: 0 5px 20px rgba(0,0,0,0.2);
-        max-width: 96vw;
-        text-align: center;
-        animation: slidein 2.4s cubic-bezier(.25,.1,.25,1) forwards;
-    }}
-    @keyframes slidein {{
-        0% {{ top: -80px; opacity: 0; }}
-        10% {{ top: 8vh; opacity: 1; }}
-        80% {{ top: 8vh; opacity: 1; }}
-        100% {{ top: -80px; opacity: 0; }}
-    }}
-    </style>
-    <div class="custom-slidein">{msg}</div>
-    """
-    st.markdown(css, unsafe_allow_html=True)
+    # Styles live in the page CSS block; unknown types keep the info colour
+    st.markdown(f'<div class="custom-slidein slidein-{type_}">{msg}</div>', unsafe_allow_html=True)
 
 def show_popup(msg, type_="info", duration=3):
     st.session_state["popup_msg"] = msg
@@ -169,36 +177,204 @@ QRCODES_DIR = os.path.join(LOCAL_STORAGE, "qrcodes")
 os.makedirs(FACES_DIR, exist_ok=True)
 os.makedirs(QRCODES_DIR, exist_ok=True)
 
+# Face images are only shown as small thumbnails
+FACE_MAX_SIZE = (512, 512)
+# Resized overlay thumbnails kept per scanner session
+THUMB_CACHE_SIZE = 32
+
 USER_CSV = os.path.join(LOCAL_STORAGE, "users.csv")
 ATTENDANCE_CSV = os.path.join(LOCAL_STORAGE, "attendance.csv")
 
 def init_csv(path, columns):
+    # Header only; rows are appended one at a time afterwards
     if not os.path.exists(path):
-        pd.DataFrame(columns=columns).to_csv(path, index=False)
+        with open(path, "w", newline="") as f:
+            csv.writer(f).writerow(columns)
 
 init_csv(USER_CSV, ["user_id", "name", "roll_number", "branch", "image_path", "qr_path"])
 init_csv(ATTENDANCE_CSV, ["user_id", "name", "roll_number", "branch", "image_path", "date", "timestamp"])
 
+# ---------------------------------
+# IN-MEMORY RECORD CACHE
+# ---------------------------------
+# Loaded once per server process and updated in place, so the scanner
+# never re-parses the CSVs for a lookup.
+@st.cache_resource
+def load_records():
+    users = {}
+    rolls = {}
+    with open(USER_CSV, newline="") as f:
+        for row in csv.DictReader(f):
+            users[row["user_id"]] = row
+            rolls[int(row["roll_number"])] = row["user_id"]
+    att_keys = set()
+    with open(ATTENDANCE_CSV, newline="") as f:
+        for row in csv.DictReader(f):
+            att_keys.add((row["user_id"], row["date"]))
+    # Users marked per date, so the dashboard never walks the history
+    att_counts = collections.Counter(d for _, d in att_keys)
+    # Serialises check-then-append across sessions, like a unique index
+    lock = threading.RLock()
+    return users, rolls, att_keys, att_counts, lock
+
+_USERS, _ROLLS, _ATT_KEYS, _ATT_COUNTS, _RECORDS_LOCK = load_records()
+
 # Helper functions
 def safe_str(v):
-    return str(v) if pd.notna(v) else ""
+    return "" if v is None else str(v)
+
+# Process-wide like load_records: a plain lru_cache would be rebuilt on every rerun
+@st.cache_data(show_spinner=False, max_entries=1024)
+def make_qr_png(user_id):
+    # The same user_id always encodes to the same PNG
+    buf = io.BytesIO()
+    qrcode.make(user_id).save(buf, "PNG")
+    return buf.getvalue()
+
+def wrap_text(line, font_scale, thickness, max_width):
+    # Greedy word wrap measured with the overlay font; only runs on sprite rebuilds
+    wrapped_lines = []
+    current_line = ""
+    for word in line.split(" "):
+        test_line = (current_line + " " + word).strip()
+        w, _ = cv2.getTextSize(test_line, cv2.FONT_HERSHEY_SIMPLEX, font_scale, thickness)[0]
+        if w <= max_width:
+            current_line = test_line
+        else:
+            wrapped_lines.append(current_line)
+            current_line = word
+    wrapped_lines.append(current_line)
+    return tuple(wrapped_lines)
+
+# One month of attendance for View Data, re-read only when the file changes.
+# The file is streamed in chunks so the full history is never held in memory.
+ATT_CHUNK_ROWS = 50000
+
+# Every flush changes the file stamp, so old entries are capped rather than kept forever
+@st.cache_data(show_spinner=False, max_entries=12)
+def _load_month(path, stamp, year, month):
+    import pandas as pd
+    prefix = f"{year:04d}-{month:02d}-"
+    reader = pd.read_csv(
+        path,
+        usecols=lambda c: c.strip().lower() in ("user_id", "date"),
+        dtype=str,
+        chunksize=ATT_CHUNK_ROWS,
+    )
+    parts = []
+    for chunk in reader:
+        chunk.columns = chunk.columns.str.strip().str.lower()
+        parts.append(chunk[chunk["date"].str.startswith(prefix, na=False)])
+    if not parts:
+        return pd.DataFrame(columns=["user_id", "date"])
+    return pd.concat(parts, ignore_index=True)
+
+def file_stamp(path):
+    # Size as well as mtime: some phone storage only keeps 2s mtimes
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+def load_attendance(year, month):
+    return _load_month(ATTENDANCE_CSV, file_stamp(ATTENDANCE_CSV), year, month)
+
+def append_rows(path, rows):
+    # Follow the column order already in the file header
+    with open(path, newline="") as f:
+        header = next(csv.reader(f))
+    start = os.path.getsize(path)
+    try:
+        with open(path, "a", newline="") as f:
+            csv.DictWriter(f, fieldnames=header, extrasaction="ignore").writerows(rows)
+            # One fsync per batch: buffered scans survive a power cut once flushed
+            f.flush()
+            os.fsync(f.fileno())
+    except OSError:
+        # All or nothing: cut off a partial batch so a retry cannot duplicate rows
+        try:
+            os.truncate(path, start)
+        except OSError:
+            pass
+        raise
+
+def drop_rows(path, column, value):
+    # Stream the file through a temp copy, leaving out rows whose column matches;
+    # os.replace swaps it in atomically so a crash never leaves a half-written file
+    tmp_path = path + ".tmp"
+    with open(path, newline="") as src, open(tmp_path, "w", newline="") as dst:
+        reader = csv.reader(src)
+        header = next(reader)
+        idx = [c.strip().lower() for c in header].index(column)
+        writer = csv.writer(dst)
+        writer.writerow(header)
+        writer.writerows(row for row in reader if len(row) <= idx or row[idx] != value)
+        dst.flush()
+        os.fsync(dst.fileno())
+    os.replace(tmp_path, path)
+
+# Attendance rows are buffered and written in batches
+FLUSH_EVERY_ROWS = 32
+FLUSH_EVERY_SECS = 2
+
+def flush_attendance(force=True):
+    with _RECORDS_LOCK:
+        rows = _PENDING["rows"]
+        due = len(rows) >= FLUSH_EVERY_ROWS or time.monotonic() - _PENDING["last_flush"] >= FLUSH_EVERY_SECS
+        if not (force or due):
+            return
+        if rows:
+            append_rows(ATTENDANCE_CSV, rows)
+            rows.clear()
+        _PENDING["last_flush"] = time.monotonic()
+
+def flush_loop(wake):
+    # Background writer: every FLUSH_EVERY_SECS, or sooner when a scan
+    # fills a batch, so scans never wait on disk
+    while True:
+        wake.wait(FLUSH_EVERY_SECS)
+        wake.clear()
+        try:
+            flush_attendance(force=False)
+        except Exception:
+            # Keep the writer alive; unwritten rows stay pending for the next pass
+            logging.exception("Attendance flush failed")
+
+@st.cache_resource
+def attendance_buffer():
+    atexit.register(flush_attendance)
+    wake = threading.Event()
+    threading.Thread(target=flush_loop, args=(wake,), daemon=True).start()
+    return {"rows": [], "last_flush": time.monotonic(), "wake": wake}
+
+_PENDING = attendance_buffer()
 
 def save_user(name, roll, branch, image_file):
     user_id = f"{roll}_{name}".replace(" ", "_")
-    df = pd.read_csv(USER_CSV)
-    if int(roll) in df["roll_number"].values:
-        row = df[df["roll_number"] == int(roll)].iloc[0]
-        return row["qr_path"], row["image_path"], row["user_id"], True
+    with _RECORDS_LOCK:
+        if int(roll) in _ROLLS:
+            row = _USERS[_ROLLS[int(roll)]]
+            return row["qr_path"], row["image_path"], row["user_id"], True
 
+    # Image and QR work runs outside the lock so scans are not held up
     img_path = ""
     if image_file:
-        img = Image.open(image_file).convert("RGB")
         img_path = os.path.join(FACES_DIR, f"{user_id}.jpg")
-        img.save(img_path)
+        img = Image.open(image_file)  # lazy: only the header is read here
+        if img.format == "JPEG" and max(img.size) <= FACE_MAX_SIZE[0]:
+            # Already a small JPEG: store the upload as-is
+            image_file.seek(0)
+            with open(img_path, "wb") as f:
+                shutil.copyfileobj(image_file, f)
+        else:
+            # draft() lets libjpeg decode at a reduced scale
+            img.draft("RGB", FACE_MAX_SIZE)
+            img.thumbnail(FACE_MAX_SIZE, Image.LANCZOS)
+            img.convert("RGB").save(img_path, "JPEG", quality=85, optimize=True)
 
-    qr_img = qrcode.make(user_id)
+    # The PNG on disk is the cache; make_qr_png covers files removed on delete
     qr_path = os.path.join(QRCODES_DIR, f"{user_id}.png")
-    qr_img.save(qr_path)
+    if not os.path.exists(qr_path):
+        with open(qr_path, "wb") as f:
+            f.write(make_qr_png(user_id))
 
     new_row = {
         "user_id": user_id,
@@ -208,37 +384,46 @@ def save_user(name, roll, branch, image_file):
         "image_path": img_path,
         "qr_path": qr_path
     }
-    df.loc[len(df)] = new_row
-    df.to_csv(USER_CSV, index=False)
+    with _RECORDS_LOCK:
+        # Check again: another session may have registered this roll meanwhile
+        if int(roll) in _ROLLS:
+            row = _USERS[_ROLLS[int(roll)]]
+            if row["user_id"] != user_id:
+                for file_path in [img_path, qr_path]:
+                    if file_path and os.path.exists(file_path):
+                        os.remove(file_path)
+            return row["qr_path"], row["image_path"], row["user_id"], True
+        append_rows(USER_CSV, [new_row])
+        _USERS[user_id] = new_row
+        _ROLLS[int(roll)] = user_id
     return qr_path, img_path, user_id, False
 
 def mark_attendance(user_id):
-    df_users = pd.read_csv(USER_CSV)
-    df_att = pd.read_csv(ATTENDANCE_CSV)
-    user = df_users[df_users["user_id"] == user_id]
-
-    if user.empty:
+    user_info = _USERS.get(user_id)
+    if user_info is None:
         return None, "not_found"
 
-    user_info = user.iloc[0].to_dict()
-    today = date.today().strftime("%Y-%m-%d")
-    already = ((df_att["user_id"] == user_id) & (df_att["date"] == today)).any()
-    if already:
-        return user_info, "duplicate"
-
-    now = datetime.now().strftime("%H:%M:%S")
-    new_entry = {
-        "user_id": user_id,
-        "name": user_info["name"],
-        "roll_number": user_info["roll_number"],
-        "branch": user_info["branch"],
-        "image_path": safe_str(user_info.get("image_path", "")),
-        "date": today,
-        "timestamp": now
-    }
-    df_att.loc[len(df_att)] = new_entry
-    df_att.to_csv(ATTENDANCE_CSV, index=False)
-    return user_info, "success"
+    with _RECORDS_LOCK:
+        today = date.today().strftime("%Y-%m-%d")
+        if (user_id, today) in _ATT_KEYS:
+            return user_info, "duplicate"
+
+        now = datetime.now().strftime("%H:%M:%S")
+        new_entry = {
+            "user_id": user_id,
+            "name": user_info["name"],
+            "roll_number": user_info["roll_number"],
+            "branch": user_info["branch"],
+            "image_path": safe_str(user_info.get("image_path", "")),
+            "date": today,
+            "timestamp": now
+        }
+        _PENDING["rows"].append(new_entry)
+        _ATT_KEYS.add((user_id, today))
+        _ATT_COUNTS[today] += 1
+        if len(_PENDING["rows"]) >= FLUSH_EVERY_ROWS:
+            _PENDING["wake"].set()
+        return user_info, "success"
 
 # ==============================
 # HOME PAGE
@@ -261,14 +446,10 @@ if st.session_state.page == "Home":
       # --- Dashboard Overview ---
     st.markdown("<h3 style='text-align:center; color:#000; margin-top:30px;'>📈 Dashboard Overview</h3>", unsafe_allow_html=True)
 
-    # Read CSVs
-    df_users = pd.read_csv(USER_CSV)
-    df_att = pd.read_csv(ATTENDANCE_CSV)
-
-    total_users = len(df_users)
+    # Counts come from the in-memory records; no CSV parse needed
+    total_users = len(_USERS)
     today_date = date.today().strftime("%Y-%m-%d")
-    today_attendance = len(df_att[df_att["date"] == today_date]) if not df_att.empty else 0
-    total_records = len(df_att)
+    today_attendance = _ATT_COUNTS[today_date]
 
     # --- CSS for Dashboard Cards ---
     st.markdown("""
@@ -363,171 +544,332 @@ if st.session_state.page == "Mark Attendance":
         set_page("Home")
     st.info("Allow camera permission for best quality.")
 
-    class QRScanner(VideoTransformerBase):
+    class QRScanner(VideoProcessorBase):
         def __init__(self):
             self.detector = cv2.QRCodeDetector()
             self.last_id = None
-            self.last_time = time.time()
+            self.last_time = time.monotonic()
+            self.frame_idx = 0
+            self.skip_until_frame = 0
+            self.detect_every = 3
+            # Laplacian variance of a 64x64 thumbnail below which a frame
+            # is too flat or blurred to hold a readable QR code
+            self.min_edge_var = 60
             self.overlay_message = ""
             self.overlay_color = (255,255,255)
             self.message_timeout = 4
             self.message_shown_time = 0
             self.current_user = None
+            self.bbox = None
+            # Last frame the decoded polygon is drawn on; see _worker
+            self.bbox_until_frame = 0
+            self._thumb_cache = collections.OrderedDict()
+            self._overlay = None
+
+            # Detection runs on a worker thread fed with the latest frame
+            # only, so recv returns without waiting on the detector
+            self.latest = collections.deque(maxlen=1)
+            self.frame_ready = threading.Event()
+            self.stopped = threading.Event()
+            self.result_lock = threading.Lock()
+            self.out_q = queue.Queue(maxsize=8)
+            threading.Thread(target=self._worker, daemon=True).start()
+
+        @staticmethod
+        def _paint(inv, premul, mask, color):
+            # Composite a layer with coverage mask (0..1) over the sprite
+            m = mask[..., None]
+            premul *= 1 - m
+            premul += m * np.asarray(color, np.float32)
+            inv *= 1 - m
+
+        def _build_overlay(self, frame_w):
+            # Render the status + user panel once as a premultiplied sprite;
+            # recv then only blends this small patch into each frame
+            txt = self.overlay_message
+            font = cv2.FONT_HERSHEY_SIMPLEX
+
+            # scale factor based on video width (1280px reference)
+            scale = frame_w / 1280
+
+            # status box text size & padding
+            font_scale = 1.0 * scale
+            thickness = max(int(3 * scale), 1)
+            (text_w, text_h), _ = cv2.getTextSize(txt, font, font_scale, thickness)
+            pad_x, pad_y = int(20 * scale), int(18 * scale)
+
+            # status box size & position; the sprite's origin is its corner
+            box_w = text_w + pad_x * 2
+            box_h = text_h + pad_y
+            box_x = int(30 * scale)
+            box_y = int(30 * scale)
+
+            # user info box below status if user exists
+            user = self.current_user
+            if user:
+                # user info text lines
+                lines = [
+                    f"Name: {user.get('name','')}",
+                    f"Roll: {user.get('roll_number','')}",
+                    f"Branch: {user.get('branch','')}",
+                    f"ID: {user.get('user_id','')}"
+                ]
+
+                # thumbnail size & position
+                thumb_w = int(100 * scale)
+                thumb_h = int(100 * scale)
+                thumb_x = int(10 * scale)
+                thumb_y = box_h + int(14 * scale)
+
+                # compute max text width
+                text_font_scale = 0.7 * scale
+                text_thickness = max(int(2 * scale), 1)
+                max_text_w = max(cv2.getTextSize(line, font, text_font_scale, text_thickness)[0][0] for line in lines)
+
+                # info box dimensions
+                info_w = thumb_w + int(14*scale) + max_text_w + int(10*scale)  # thumbnail + gap + text + padding
+                info_h = max(thumb_h + int(20*scale), int(len(lines)*26*scale + 10*scale))  # enough for all text
+                info_y = thumb_y - int(10*scale)
+
+                sprite_w, sprite_h = max(box_w, info_w), info_y + info_h
+            else:
+                sprite_w, sprite_h = box_w, box_h
+
+            inv = np.ones((sprite_h, sprite_w, 1), np.float32)
+            premul = np.zeros((sprite_h, sprite_w, 3), np.float32)
+
+            # status background and text
+            mask = np.zeros((sprite_h, sprite_w), np.float32)
+            mask[:box_h, :box_w] = 0.8
+            self._paint(inv, premul, mask, self.overlay_color[::-1])
+            text_mask = np.zeros((sprite_h, sprite_w), np.uint8)
+            cv2.putText(text_mask, txt, (pad_x, box_h - int(8*scale)), font, font_scale, 255, thickness, cv2.LINE_AA)
+            self._paint(inv, premul, text_mask / np.float32(255), (255,255,255))
+
+            if user:
+                # info box background
+                mask = np.zeros((sprite_h, sprite_w), np.float32)
+                mask[info_y:info_y+info_h, :info_w] = 0.6
+                self._paint(inv, premul, mask, (40,40,40))
+
+                # thumbnail, or a grey placeholder frame
+                thumb = self._get_thumb(safe_str(user.get("image_path","")), thumb_w, thumb_h)
+                mask = np.zeros((sprite_h, sprite_w), np.float32)
+                if thumb is not None:
+                    color = np.zeros((sprite_h, sprite_w, 3), np.float32)
+                    color[thumb_y:thumb_y+thumb_h, thumb_x:thumb_x+thumb_w] = thumb
+                    mask[thumb_y:thumb_y+thumb_h, thumb_x:thumb_x+thumb_w] = 1
+                    self._paint(inv, premul, mask, color)
+                else:
+                    cv2.rectangle(mask, (thumb_x, thumb_y), (thumb_x+thumb_w, thumb_y+thumb_h), 1, 2)
+                    self._paint(inv, premul, mask, (120,120,120))
+
+                # text to right of thumbnail
+                text_x = thumb_x + thumb_w + int(14*scale)
+                text_y = thumb_y + int(20*scale)
+                line_height = int(26*scale)
+                text_mask = np.zeros((sprite_h, sprite_w), np.uint8)
+
+                for i, line in enumerate(lines):
+                    # wrap text if too long
+                    max_width = info_w - (thumb_w + int(14*scale) + int(10*scale))
+                    wrapped_lines = wrap_text(line, text_font_scale, text_thickness, max_width)
+
+                    # draw wrapped lines
+                    for j, wline in enumerate(wrapped_lines):
+                        y_pos = text_y + (i*len(wrapped_lines) + j)*line_height
+                        cv2.putText(text_mask, wline, (text_x, y_pos), font,
+                                    text_font_scale, 255, text_thickness, cv2.LINE_AA)
+
+                self._paint(inv, premul, text_mask / np.float32(255), (255,255,255))
+
+            # 8-bit, 3-channel layers so recv can blend in place with cv2
+            inv = np.repeat(np.rint(inv * 255), 3, axis=2).astype(np.uint8)
+            premul = np.rint(premul).astype(np.uint8)
+            return box_x, box_y, inv, premul
+
+        def _get_thumb(self, path, w, h):
+            # Decode and resize each face image once, not on every scan;
+            # the mtime keeps a re-registered photo from being served stale
+            try:
+                mtime = os.stat(path).st_mtime_ns if path else None
+            except OSError:
+                mtime = None
+            key = (path, mtime, w, h)
+            try:
+                self._thumb_cache.move_to_end(key)
+                return self._thumb_cache[key]
+            except KeyError:
+                pass
+            thumb = None
+            if mtime is not None:
+                thumb = cv2.imread(path)
+                if thumb is not None:
+                    thumb = cv2.resize(thumb, (w, h))
+            self._thumb_cache[key] = thumb
+            if len(self._thumb_cache) > THUMB_CACHE_SIZE:
+                self._thumb_cache.popitem(last=False)
+            return thumb
+
+        def _detect(self, gray):
+            data, bbox = "", None
+
+            # Locate the QR on a half-size copy of large frames; corners are
+            # scaled back to full-frame coordinates for drawing and decoding
+            if gray.shape[1] > 640:
+                small = cv2.resize(gray, (0, 0), fx=0.5, fy=0.5, interpolation=cv2.INTER_AREA)
+            else:
+                small = gray
+            scale_xy = (gray.shape[1] / small.shape[1], gray.shape[0] / small.shape[0])
+
+            if zbar_decode is not None:
+                # Badges are QR only; skip zbar's 1D barcode scanners
+                results = zbar_decode(small, symbols=[ZBarSymbol.QRCODE])
+                if results:
+                    data = results[0].data.decode("utf-8", errors="ignore")
+                    bbox = (np.array(results[0].polygon, dtype=np.float32) * scale_xy).astype(np.float32)
+                return data, bbox
+
+            found, points = self.detector.detect(small)
+            if found and points is not None:
+                bbox = (points * scale_xy).astype(np.float32)
+                data, _ = self.detector.decode(gray, bbox)
+            return data, bbox
+
+        def _worker(self):
+            while not self.stopped.is_set():
+                if not self.frame_ready.wait(timeout=0.5):
+                    continue
+                self.frame_ready.clear()
+                try:
+                    gray = self.latest.pop()
+                except IndexError:
+                    continue
+
+                # Cheap gate before the full detector pass
+                tiny = cv2.resize(gray, (64, 64), interpolation=cv2.INTER_AREA)
+                if cv2.Laplacian(tiny, cv2.CV_16S).var() < self.min_edge_var:
+                    with self.result_lock:
+                        self.bbox = None
+                    continue
+
+                data, bbox = self._detect(gray)
+                with self.result_lock:
+                    # Stored ready for cv2.polylines so recv() never converts it
+                    self.bbox = None if bbox is None else bbox.astype(np.int32).reshape(-1,1,2)
+                    # Drawn only until the next detection pass is due, so the
+                    # box never outlives the frames it was found on (e.g. in
+                    # the skip window below, when the worker is not fed)
+                    self.bbox_until_frame = self.frame_idx + self.detect_every
+                    if data:
+                        # ~1.5s at 15fps: the badge is usually still in view
+                        self.skip_until_frame = self.frame_idx + 22
+
+                if data:
+                    user_id = data.strip()
+                    if user_id and user_id != self.last_id and (time.monotonic() - self.last_time > 1.5):
+                        # Attendance is marked on the script thread, see drain_scans
+                        try:
+                            self.out_q.put_nowait(user_id)
+                        except queue.Full:
+                            pass
+                        self.last_id = user_id
+                        self.last_time = time.monotonic()
+
+        def show_result(self, user_info, status):
+            with self.result_lock:
+                self.current_user = user_info
+                if status == "success":
+                    self.overlay_message = " Attendance Marked"
+                    self.overlay_color = (0,200,0)
+                elif status == "duplicate":
+                    self.overlay_message = " Already Marked"
+                    self.overlay_color = (0,200,200)
+                elif status == "not_found":
+                    self.overlay_message = " User Not Found"
+                    self.overlay_color = (0,0,200)
+                self.message_shown_time = time.time()
+                self._overlay = None
+
+        def on_ended(self):
+            self.stopped.set()
+
+        def recv(self, frame):
+            # Detect on every Nth frame only, and not at all for a while
+            # after a successful decode
+            self.frame_idx += 1
+            if self.frame_idx >= self.skip_until_frame and self.frame_idx % self.detect_every == 0:
+                # libswscale converts straight to the detector's grayscale
+                # input; the worker owns this buffer
+                self.latest.append(frame.to_ndarray(format="gray"))
+                self.frame_ready.set()
+
+            with self.result_lock:
+                if self.overlay_message and (time.time() - self.message_shown_time > self.message_timeout):
+                    self.overlay_message = ""
+                    self.overlay_color = (255,255,255)
+                    self.current_user = None
+                    self._overlay = None
+
+                # ==============================
+                # Responsive Overlay + User Info
+                # ==============================
+                # Rebuilt only when the message, user or frame width changes
+                overlay = None
+                if self.overlay_message:
+                    if self._overlay is None or self._overlay[0] != frame.width:
+                        self._overlay = (frame.width,) + self._build_overlay(frame.width)
+                    overlay = self._overlay
+
+                bbox = self.bbox if self.frame_idx <= self.bbox_until_frame else None
+            if bbox is None and overlay is None:
+                # Nothing to draw: return the incoming frame untouched
+                return frame
 
-        def _draw_transparent_rect(self, img, x, y, w, h, color=(0,0,0), alpha=0.6):
-            overlay = img.copy()
-            cv2.rectangle(overlay, (x, y), (x+w, y+h), color, -1)
-            cv2.addWeighted(overlay, alpha, img, 1 - alpha, 0, img)
-
-        def transform(self, frame):
             image = frame.to_ndarray(format="bgr24")
-            data, bbox, _ = self.detector.detectAndDecode(image)
-
             if bbox is not None:
-                pts = bbox.astype(int).reshape(-1,2)
-                for i in range(len(pts)):
-                    cv2.line(image, tuple(pts[i]), tuple(pts[(i+1)%len(pts)]), (0,255,0), 2)
-
-            if data:
-                user_id = data.strip()
-                if user_id and user_id != self.last_id and (time.time() - self.last_time > 1.5):
-                    user_info, status = mark_attendance(user_id)
-                    st.session_state["user_info"] = user_info
-                    st.session_state["last_popup"] = status
-                    self.current_user = user_info
-
-                    if status == "success":
-                        self.overlay_message = " Attendance Marked"
-                        self.overlay_color = (0,200,0)
-                    elif status == "duplicate":
-                        self.overlay_message = " Already Marked"
-                        self.overlay_color = (0,200,200)
-                    elif status == "not_found":
-                        self.overlay_message = " User Not Found"
-                        self.overlay_color = (0,0,200)
-
-                    self.last_id = user_id
-                    self.last_time = time.time()
-                    self.message_shown_time = time.time()
-
-            if self.overlay_message and (time.time() - self.message_shown_time > self.message_timeout):
-                self.overlay_message = ""
-                self.overlay_color = (255,255,255)
-                self.current_user = None
-
-             # ==============================
-            # Responsive Overlay + User Info
-            # ==============================
-            if self.overlay_message:
-                txt = self.overlay_message
-                frame_h, frame_w = image.shape[:2]
-
-                # scale factor based on video width (1280px reference)
-                scale = frame_w / 1280
-
-                # status box text size & padding
-                font_scale = 1.0 * scale
-                thickness = max(int(3 * scale), 1)
-                (text_w, text_h), _ = cv2.getTextSize(txt, cv2.FONT_HERSHEY_SIMPLEX, font_scale, thickness)
-                pad_x, pad_y = int(20 * scale), int(18 * scale)
-
-                # status box position
-                box_w = text_w + pad_x * 2
-                box_h = text_h + pad_y
-                box_x = int(30 * scale)
-                box_y = int(30 * scale)
-
-                # draw status background
-                self._draw_transparent_rect(image, box_x, box_y, box_w, box_h, color=self.overlay_color[::-1], alpha=0.8)
-                # draw status text
-                cv2.putText(image, txt, (box_x + pad_x, box_y + box_h - int(8*scale)),
-                            cv2.FONT_HERSHEY_SIMPLEX, font_scale, (255,255,255), thickness, cv2.LINE_AA)
-
-                # draw user info box below status if user exists
-                user = self.current_user if self.current_user else st.session_state.get("user_info", None)
-                if user:
-                    # user info text lines
-                    lines = [
-                        f"Name: {user.get('name','')}",
-                        f"Roll: {user.get('roll_number','')}",
-                        f"Branch: {user.get('branch','')}",
-                        f"ID: {user.get('user_id','')}"
-                    ]
-
-                    # thumbnail size & position
-                    thumb_w = int(100 * scale)
-                    thumb_h = int(100 * scale)
-                    thumb_x = box_x + int(10 * scale)
-                    thumb_y = box_y + box_h + int(14 * scale)
-
-                    # compute max text width
-                    text_font_scale = 0.7 * scale
-                    text_thickness = max(int(2 * scale), 1)
-                    max_text_w = max(cv2.getTextSize(line, cv2.FONT_HERSHEY_SIMPLEX, text_font_scale, text_thickness)[0][0] for line in lines)
-
-                    # info box dimensions
-                    info_w = thumb_w + int(14*scale) + max_text_w + int(10*scale)  # thumbnail + gap + text + padding
-                    info_h = max(thumb_h + int(20*scale), int(len(lines)*26*scale + 10*scale))  # enough for all text
-                    info_x = box_x
-                    info_y = thumb_y - int(10*scale)
-
-                    # draw info box background
-                    self._draw_transparent_rect(image, info_x, info_y, info_w, info_h, color=(40,40,40), alpha=0.6)
-
-                    # draw thumbnail
-                    if user.get("image_path"):
-                        try:
-                            img_path = safe_str(user.get("image_path",""))
-                            if img_path and os.path.exists(img_path):
-                                thumb = cv2.imread(img_path)
-                                if thumb is not None:
-                                    thumb = cv2.resize(thumb, (thumb_w, thumb_h))
-                                    image[thumb_y:thumb_y+thumb_h, thumb_x:thumb_x+thumb_w] = thumb
-                                else:
-                                    cv2.rectangle(image, (thumb_x, thumb_y), (thumb_x+thumb_w, thumb_y+thumb_h), (120,120,120), 2)
-                            else:
-                                cv2.rectangle(image, (thumb_x, thumb_y), (thumb_x+thumb_w, thumb_y+thumb_h), (120,120,120), 2)
-                        except:
-                            cv2.rectangle(image, (thumb_x, thumb_y), (thumb_x+thumb_w, thumb_y+thumb_h), (120,120,120), 2)
-                    else:
-                        cv2.rectangle(image, (thumb_x, thumb_y), (thumb_x+thumb_w, thumb_y+thumb_h), (120,120,120), 2)
-
-                    # draw text to right of thumbnail
-                    text_x = thumb_x + thumb_w + int(14*scale)
-                    text_y = thumb_y + int(20*scale)
-                    line_height = int(26*scale)
-
-                    for i, line in enumerate(lines):
-                        # wrap text if too long
-                        max_width = info_w - (thumb_w + int(14*scale) + int(10*scale))
-                        wrapped_lines = []
-                        words = line.split(" ")
-                        current_line = ""
-                        for word in words:
-                            test_line = (current_line + " " + word).strip()
-                            w, _ = cv2.getTextSize(test_line, cv2.FONT_HERSHEY_SIMPLEX, text_font_scale, text_thickness)[0]
-                            if w <= max_width:
-                                current_line = test_line
-                            else:
-                                wrapped_lines.append(current_line)
-                                current_line = word
-                        wrapped_lines.append(current_line)
-
-                        # draw wrapped lines
-                        for j, wline in enumerate(wrapped_lines):
-                            y_pos = text_y + (i*len(wrapped_lines) + j)*line_height
-                            cv2.putText(image, wline, (text_x, y_pos), cv2.FONT_HERSHEY_SIMPLEX,
-                                        text_font_scale, (255,255,255), text_thickness, cv2.LINE_AA)
-
-            return image
-
-    webrtc_streamer(
+                cv2.polylines(image, [bbox], True, (0,255,0), 2)
+
+            if overlay is not None:
+                _, x, y, inv, premul = overlay
+                h = min(inv.shape[0], image.shape[0] - y)
+                w = min(inv.shape[1], image.shape[1] - x)
+                if h > 0 and w > 0:
+                    # In-place blend on the overlay's ROI only: no frame copy
+                    # and no float temporaries
+                    roi = image[y:y+h, x:x+w]
+                    cv2.multiply(roi, inv[:h, :w], dst=roi, scale=1/255)
+                    cv2.add(roi, premul[:h, :w], dst=roi)
+
+            return av.VideoFrame.from_ndarray(image, format="bgr24")
+
+    ctx = webrtc_streamer(
         key="qrscan_hd",
-        video_transformer_factory=QRScanner,
-        media_stream_constraints={"video":{"width":{"ideal":1280},"height":{"ideal":720},"facingMode":"environment"},"audio":False},
-        async_transform=True
+        video_processor_factory=QRScanner,
+        media_stream_constraints={"video":{"width":{"ideal":640,"max":640},"height":{"ideal":480,"max":480},"frameRate":{"ideal":15,"max":15},"facingMode":"environment"},"audio":False},
+        async_processing=True
     )
 
+    # Drain decoded ids on the script thread: session state and the CSV
+    # writes stay off the video threads
+    @st.fragment(run_every=0.5)
+    def drain_scans(ctx):
+        scanner = ctx.video_processor
+        if scanner is None:
+            return
+        while True:
+            try:
+                user_id = scanner.out_q.get_nowait()
+            except queue.Empty:
+                break
+            user_info, status = mark_attendance(user_id)
+            st.session_state["user_info"] = user_info
+            st.session_state["last_popup"] = status
+            scanner.show_result(user_info, status)
+
+    if ctx.state.playing:
+        drain_scans(ctx)
+
 # ==============================
 # Show popup if active in session state
 # ==============================
@@ -550,15 +892,16 @@ if st.session_state.page == "View Data":
     # -------------------------
     # Read attendance & user data
     # -------------------------
-    df_att = pd.read_csv(ATTENDANCE_CSV)
-    df_users = pd.read_csv(USER_CSV)
+    # pandas is only needed here, so it is imported lazily
+    import pandas as pd
+    flush_attendance()
 
-    # Normalize column names
-    df_att.columns = df_att.columns.str.strip().str.lower()
-    df_users.columns = df_users.columns.str.strip().str.lower()
+    # Only the header is read here; rows are loaded for the selected month below
+    with open(ATTENDANCE_CSV, newline="") as f:
+        att_columns = [c.strip().lower() for c in next(csv.reader(f), [])]
 
     # Ensure 'date' exists
-    if "date" not in df_att.columns:
+    if "date" not in att_columns:
         st.error("⚠️ 'date' column missing in attendance.csv.")
         st.stop()
 
@@ -610,10 +953,11 @@ if st.session_state.page == "View Data":
         index=today.month - 1
     )
 
-    user_list = df_users["name"].tolist() if not df_users.empty else []
+    user_list = list(_USERS)
     selected_user = st.selectbox(
         "Select User",
-        user_list if user_list else ["No users found"]
+        user_list if user_list else ["No users found"],
+        format_func=lambda uid: _USERS[uid]["name"] if uid in _USERS else uid
     )
 
     if not user_list:
@@ -627,20 +971,14 @@ if st.session_state.page == "View Data":
     month_days = calendar.monthrange(selected_year, month_num)[1]
     first_day = dt.date(selected_year, month_num, 1)
 
-    # Prepare attendance dataframe
-    df_att["date"] = pd.to_datetime(df_att["date"], errors="coerce").dt.date
-
-    # Filter for month
-    df_month = df_att[
-        (pd.to_datetime(df_att["date"], errors="coerce").dt.year == selected_year) &
-        (pd.to_datetime(df_att["date"], errors="coerce").dt.month == month_num)
-    ]
+    # Attendance for the selected month; dates parsed in the format mark_attendance writes
+    df_month = load_attendance(selected_year, month_num)
+    df_month["date"] = pd.to_datetime(df_month["date"], format="%Y-%m-%d", errors="coerce").dt.date
 
-    user_row = df_users[df_users["name"] == selected_user].iloc[0]
-    user_id = str(user_row["user_id"]) if "user_id" in user_row else None
+    user_id = selected_user
 
     # Get user's attendance dates
-    user_dates = set(df_month[df_month["user_id"].astype(str) == user_id]["date"].tolist())
+    user_dates = set(df_month[df_month["user_id"] == user_id]["date"].tolist())
 
     # Get all recorded dates in that month (anyone’s attendance)
     all_attendance_dates = set(df_month["date"].tolist())
@@ -771,13 +1109,21 @@ if st.session_state.page == "View Data":
 
  # Delete user record
     st.subheader("🗑️ Delete User Record")
-    if not df_users.empty:
-        user_to_delete = st.selectbox("Select user to delete", df_users["user_id"].tolist())
+    if _USERS:
+        user_to_delete = st.selectbox("Select user to delete", list(_USERS))
         if st.button("Delete Selected User"):
-            df_users = df_users[df_users["user_id"] != user_to_delete]
-            df_users.to_csv(USER_CSV, index=False)
-            df_att = df_att[df_att["user_id"] != user_to_delete]
-            df_att.to_csv(ATTENDANCE_CSV, index=False)
+            with _RECORDS_LOCK:
+                flush_attendance()
+                # _ATT_KEYS mirrors the file, so skip the rewrite if the user has no rows
+                user_keys = {k for k in _ATT_KEYS if k[0] == user_to_delete}
+                if user_keys:
+                    drop_rows(ATTENDANCE_CSV, "user_id", user_to_delete)
+                drop_rows(USER_CSV, "user_id", user_to_delete)
+                removed = _USERS.pop(user_to_delete, None)
+                if removed is not None:
+                    _ROLLS.pop(int(removed["roll_number"]), None)
+                _ATT_KEYS.difference_update(user_keys)
+                _ATT_COUNTS.subtract(d for _, d in user_keys)
             user_qr = os.path.join(QRCODES_DIR, f"{user_to_delete}.png")
             user_img = os.path.join(FACES_DIR, f"{user_to_delete}.jpg")
             for file_path in [user_qr, user_img]:
@@ -808,9 +1154,13 @@ if st.session_state.page == "View Data":
                     if os.path.exists(ATTENDANCE_CSV):
                         ts = datetime.now().strftime("%Y%m%d_%H%M%S")
                         backup_path = os.path.join(LOCAL_STORAGE, f"attendance_backup_{ts}.csv")
-                        shutil.copy(ATTENDANCE_CSV, backup_path)
-                        empty = pd.DataFrame(columns=["user_id", "name", "roll_number", "branch", "image_path", "date", "timestamp"])
-                        empty.to_csv(ATTENDANCE_CSV, index=False)
+                        with _RECORDS_LOCK:
+                            flush_attendance()
+                            shutil.copy(ATTENDANCE_CSV, backup_path)
+                            empty = pd.DataFrame(columns=["user_id", "name", "roll_number", "branch", "image_path", "date", "timestamp"])
+                            empty.to_csv(ATTENDANCE_CSV, index=False)
+                            _ATT_KEYS.clear()
+                            _ATT_COUNTS.clear()
                         st.session_state["confirm_delete_all"] = False
                         show_popup("🗑️ All attendance records deleted successfully! (backup created)", "success")
                         st.rerun()